@@ -1,18 +1,57 @@
 import streamlit as st
-from agents import Agent, FileSearchTool, Runner, WebSearchTool
 import asyncio
+import concurrent.futures
+import hashlib
+import itertools
 import os
+import queue
+import threading
+from collections import deque
 from config import config
 
-# Function to load agent instructions from file
-def load_agent_instructions():
-    """Load agent instructions from agent_instructions.txt file."""
+INSTRUCTIONS_FILE = "agent_instructions.txt"
+
+# Session mode context appended to the base instructions, keyed by (enable_web, enable_docs)
+_MODE_SUFFIX = {
+    # Document-only mode - be very strict
+    (False, True): "\n\nCURRENT SESSION MODE: DOCUMENT-ONLY SEARCH. You can ONLY use information from the uploaded documents via vector search. Do NOT use any general knowledge, training data, or external information. If the answer is not in the documents, clearly state 'I don't have information about [topic] in the uploaded documents.'",
+    # Web-only mode
+    (True, False): "\n\nCURRENT SESSION MODE: WEB-ONLY SEARCH. You can only use information from web search results.",
+    # Both sources available
+    (True, True): "\n\nCURRENT SESSION MODE: HYBRID SEARCH. You have access to both document search and web search. Use both sources appropriately.",
+}
+
+# Search sources in use for each (enable_web, enable_docs) mode
+_SOURCES_ENABLED = {
+    (True, False): ("web search",),
+    (False, True): ("vector data store search",),
+    (True, True): ("web search", "vector data store search"),
+}
+_SOURCES_TEXT = {mode: " and ".join(sources) for mode, sources in _SOURCES_ENABLED.items()}
+
+# Cached file read; the mtime argument makes edits to the file invalidate the cache.
+# Returns the text and a compact blake2b digest of it, used to key the cached agent.
+@st.cache_data(ttl=300, show_spinner=False)
+def _read_agent_instructions(mtime):
     try:
-        with open("agent_instructions.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+        with open(INSTRUCTIONS_FILE, "r", encoding="utf-8") as f:
+            text = f.read().strip()
     except FileNotFoundError:
         # Fallback instructions if file not found
-        return "You are a research assistant who helps users find information using available search tools. Always cite your sources."
+        text = "You are a research assistant who helps users find information using available search tools. Always cite your sources."
+    return text, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def _instructions_mtime():
+    try:
+        return os.path.getmtime(INSTRUCTIONS_FILE)
+    except OSError:
+        return None
+
+# Function to load agent instructions from file
+def load_agent_instructions():
+    """Load agent instructions from agent_instructions.txt file."""
+    text, _ = _read_agent_instructions(_instructions_mtime())
+    return text
 
 # Page configuration
 st.set_page_config(
@@ -25,8 +64,9 @@ st.set_page_config(
 st.title(f"{config.APP_ICON} {config.APP_TITLE}")
 st.markdown("Ask questions about your uploaded documents or search the web for information.")
 
-# Sidebar for configuration
-with st.sidebar:
+# Sidebar for configuration, run as a fragment so widget changes only rerun the sidebar
+@st.fragment
+def _sidebar():
     st.header("⚙️ Configuration")
     
     # Get environment status
@@ -104,124 +144,285 @@ with st.sidebar:
     st.info("💡 Add your credentials to a `.env` file:\n```\nOPENAI_API_KEY=your_key_here\nVECTOR_STORE_ID=your_id_here\n```")
     
     if st.button("Clear Chat History"):
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=config.MAX_HISTORY)
+        st.rerun()
+    
+    if st.button("Rerun Chat History"):
+        st.session_state.rerun_history = True
         st.rerun()
+    
+    # Share the selected settings with the chat handler on the next full run
+    st.session_state.use_web_search = use_web_search
+    st.session_state.use_document_search = use_document_search
+    st.session_state.max_results = max_results
+
+with st.sidebar:
+    _sidebar()
 
-# Initialize session state for chat messages
+use_web_search = st.session_state.use_web_search
+use_document_search = st.session_state.use_document_search
+max_results = st.session_state.max_results
+
+# Initialize session state for chat messages, keeping only the most recent turns
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=config.MAX_HISTORY)
 
 # Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-        # Display metadata if available
-        if "metadata" in message:
-            with st.expander("ℹ️ Search Info"):
-                st.json(message["metadata"])
+@st.fragment
+def _history():
+    # Consecutive messages from the same role share one chat bubble and one markdown block
+    for role, group in itertools.groupby(st.session_state.messages, key=lambda m: m["role"]):
+        group = list(group)
+        with st.chat_message(role):
+            st.markdown("\n\n---\n\n".join(m["content"] for m in group))
+            # Display metadata if available
+            metadata = [m["metadata"] for m in group if "metadata" in m]
+            if metadata:
+                with st.expander("ℹ️ Search Info"):
+                    for entry in metadata:
+                        st.code(entry, language="json")
 
-# Function to run the agent
-async def run_agent(query, api_key, vs_id, enable_web, enable_docs, max_doc_results):
-    os.environ["OPENAI_API_KEY"] = api_key
+_history()
+
+# Hand the configured key to the SDK once, before its client is first built
+@st.cache_resource(show_spinner=False)
+def _configure_openai_key():
+    from agents import set_default_openai_key
+    
+    if config.OPENAI_API_KEY:
+        set_default_openai_key(config.OPENAI_API_KEY)
+
+# Persistent event loop so the OpenAI client's connection pool survives between chat turns
+@st.cache_resource(show_spinner=False)
+def _event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+# Cached agent construction, keyed on the tool settings, agent name and model and the
+# instructions file digest; the underscore-prefixed instructions text is left out of the key
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _build_agent(enable_web, enable_docs, max_doc_results, vs_id, agent_name, agent_model, instructions_digest, _instructions):
+    from agents import Agent, FileSearchTool, WebSearchTool
     
-    # Build tools list based on configuration
     tools = []
-    sources_used = []
     
     if enable_web:
         tools.append(WebSearchTool())
-        sources_used.append("web search")
     
     if enable_docs:
-        if not vs_id:
-            raise ValueError("Document search enabled but Vector Store ID is missing")
         tools.append(
             FileSearchTool(
                 max_num_results=max_doc_results,
                 vector_store_ids=[vs_id],
             )
         )
-        sources_used.append("vector data store search")
     
-    if not tools:
+    return Agent(
+        name=agent_name,
+        instructions=_instructions,
+        tools=tools,
+        model=agent_model
+    )
+
+# Function to run the agent
+async def run_agent(query, vs_id, enable_web, enable_docs, max_doc_results, on_delta=None):
+    # Imported lazily to keep the SDK off the initial page render path
+    from agents import Runner
+    from openai.types.responses import ResponseTextDeltaEvent
+    
+    if enable_docs and not vs_id:
+        raise ValueError("Document search enabled but Vector Store ID is missing")
+    
+    if not enable_web and not enable_docs:
         raise ValueError("At least one search source must be enabled")
 
-    # Load base instructions from agent_instructions.txt file
-    instructions = load_agent_instructions()
-    
-    # Add dynamic context based on enabled sources
-    if enable_docs and not enable_web:
-        # Document-only mode - be very strict
-        instructions += "\n\nCURRENT SESSION MODE: DOCUMENT-ONLY SEARCH. You can ONLY use information from the uploaded documents via vector search. Do NOT use any general knowledge, training data, or external information. If the answer is not in the documents, clearly state 'I don't have information about [topic] in the uploaded documents.'"
-    elif enable_web and not enable_docs:
-        # Web-only mode
-        instructions += "\n\nCURRENT SESSION MODE: WEB-ONLY SEARCH. You can only use information from web search results."
-    elif enable_web and enable_docs:
-        # Both sources available
-        instructions += "\n\nCURRENT SESSION MODE: HYBRID SEARCH. You have access to both document search and web search. Use both sources appropriately."
-    
-    # Add current sources info
-    sources_text = " and ".join(sources_used)
-    instructions += f"\n\nCURRENT ACTIVE SOURCES: {sources_text}"
-    
-    agent = Agent(
-        name=config.AGENT_NAME,
-        instructions=instructions,
-        tools=tools,
-        model=config.AGENT_MODEL
+    # Base instructions from agent_instructions.txt plus the mode-specific context
+    mode = (enable_web, enable_docs)
+    base_instructions, instructions_digest = _read_agent_instructions(_instructions_mtime())
+    instructions = (
+        base_instructions
+        + _MODE_SUFFIX[mode]
+        + f"\n\nCURRENT ACTIVE SOURCES: {_SOURCES_TEXT[mode]}"
     )
     
-    result = await Runner.run(agent, query)
+    agent = _build_agent(
+        enable_web,
+        enable_docs,
+        max_doc_results,
+        vs_id,
+        config.AGENT_NAME,
+        config.AGENT_MODEL,
+        instructions_digest,
+        instructions
+    )
+    
+    result = Runner.run_streamed(agent, query)
+    
+    # Forward text deltas as they arrive so the reply can be rendered incrementally
+    async for event in result.stream_events():
+        if on_delta and event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            on_delta(event.data.delta)
     
     return {
         "response": result.final_output,
         "metadata": {
-            "sources_enabled": sources_used,
+            "sources_enabled": _SOURCES_ENABLED[mode],
             "web_search": enable_web,
             "document_search": enable_docs,
             "max_doc_results": max_doc_results if enable_docs else None
         }
     }
 
+# Function to run several queries concurrently (e.g. rerunning the chat history), at most
+# max_concurrency at a time; a failed query comes back as its exception so the others still complete
+async def run_agents_batch(prompts, vs_id, enable_web, enable_docs, max_doc_results, max_concurrency=4):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def _run(prompt):
+        async with semaphore:
+            return await run_agent(prompt, vs_id, enable_web, enable_docs, max_doc_results)
+    
+    return await asyncio.gather(*(_run(prompt) for prompt in prompts), return_exceptions=True)
+
+# Reason the current settings can't be used to query the agent, if any
+def _settings_error():
+    if not config.OPENAI_API_KEY:
+        return "Please add your OpenAI API Key to the .env file."
+    if not config.VECTOR_STORE_ID and use_document_search:
+        return "Please add your Vector Store ID to the .env file or disable Document Search."
+    if not use_web_search and not use_document_search:
+        return "Please enable at least one search source in the sidebar."
+    return None
+
+def _check_for_stop():
+    # Reading session state lets Streamlit raise a pending stop or rerun
+    st.session_state.messages
+
+def _assistant_message(result):
+    # Serialize metadata once here rather than on every history replay
+    import orjson
+    return {
+        "role": "assistant", 
+        "content": result["response"],
+        "metadata": orjson.dumps(result["metadata"], option=orjson.OPT_INDENT_2).decode()
+    }
+
+# Rerun chat history: ask every earlier question again with the current settings
+if st.session_state.pop("rerun_history", False):
+    if error := _settings_error():
+        st.error(error)
+    else:
+        # Group the history into turns: a user message followed by its replies
+        turns = []
+        for message in st.session_state.messages:
+            if message["role"] == "user" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        prompts = [turn[0]["content"] for turn in turns if turn[0]["role"] == "user"]
+        with st.spinner("Rerunning chat history..."):
+            _configure_openai_key()
+            future = asyncio.run_coroutine_threadsafe(
+                run_agents_batch(
+                    prompts,
+                    config.VECTOR_STORE_ID,
+                    use_web_search,
+                    use_document_search,
+                    max_results
+                ),
+                _event_loop()
+            )
+            try:
+                while True:
+                    try:
+                        results = future.result(timeout=0.2)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        _check_for_stop()
+            finally:
+                # Stop the batch if the script was interrupted
+                future.cancel()
+        
+        results = iter(results)
+        messages = deque(maxlen=config.MAX_HISTORY)
+        for turn in turns:
+            if turn[0]["role"] != "user":
+                messages.extend(turn)
+                continue
+            result = next(results)
+            messages.append(turn[0])
+            if not isinstance(result, BaseException):
+                messages.append(_assistant_message(result))
+            elif len(turn) > 1:
+                # A prompt that failed this time keeps its previous answer
+                messages.extend(turn[1:])
+            else:
+                messages.append({"role": "assistant", "content": f"Error: {str(result)}"})
+        st.session_state.messages = messages
+        st.rerun()
+
 # Chat input
 if prompt := st.chat_input("Ask a question..."):
     # Check if API key and vector store ID are provided
-    if not config.OPENAI_API_KEY:
-        st.error("Please add your OpenAI API Key to the .env file.")
-    elif not config.VECTOR_STORE_ID and use_document_search:
-        st.error("Please add your Vector Store ID to the .env file or disable Document Search.")
-    elif not use_web_search and not use_document_search:
-        st.error("Please enable at least one search source in the sidebar.")
+    if error := _settings_error():
+        st.error(error)
     else:
         # Add user message to chat
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # Get assistant response
-        with st.spinner("Thinking..."):
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        
+        # Get assistant response, streaming text deltas from the event loop thread
+        deltas = queue.Queue()
+        with st.chat_message("assistant"):
+            _configure_openai_key()
+            future = asyncio.run_coroutine_threadsafe(
+                run_agent(
+                    prompt, 
+                    config.VECTOR_STORE_ID,
+                    use_web_search,
+                    use_document_search,
+                    max_results,
+                    on_delta=deltas.put
+                ),
+                _event_loop()
+            )
+            # None marks the end of the stream, whether the run succeeded or failed
+            future.add_done_callback(lambda _: deltas.put(None))
+            
+            def _stream_deltas():
+                while True:
+                    try:
+                        delta = deltas.get(timeout=0.2)
+                    except queue.Empty:
+                        _check_for_stop()
+                        continue
+                    if delta is None:
+                        return
+                    yield delta
+            
             try:
-                result = asyncio.run(
-                    run_agent(
-                        prompt, 
-                        config.OPENAI_API_KEY, 
-                        config.VECTOR_STORE_ID,
-                        use_web_search,
-                        use_document_search,
-                        max_results
-                    )
-                )
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": result["response"],
-                    "metadata": result["metadata"]
-                })
-                st.rerun()
+                streamed = st.write_stream(_stream_deltas())
+                
+                result = future.result()
+                if not streamed:
+                    st.markdown(result["response"])
+                message = _assistant_message(result)
+                with st.expander("ℹ️ Search Info"):
+                    st.code(message["metadata"], language="json")
+                st.session_state.messages.append(message)
             except Exception as e:
                 error_msg = f"Error: {str(e)}"
+                st.markdown(error_msg)
                 st.session_state.messages.append({
                     "role": "assistant", 
                     "content": error_msg
                 })
-                st.rerun()
+            finally:
+                # Stop the agent run if the script was interrupted mid-stream
+                future.cancel()
 
 # Footer
 st.markdown("---")
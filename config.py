@@ -4,9 +4,45 @@ Supports multiple secure configuration methods.
 """
 import os
 import json
+from functools import cache
 from pathlib import Path
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping
+
+# External config file (outside project), resolved once per process
+_EXTERNAL_CONFIG = Path.home() / ".config" / "youtube-assistant" / "config.json"
+
+# Default configuration values (read-only)
+_DEFAULTS: Mapping[str, Any] = MappingProxyType({
+    "OPENAI_API_KEY": "",
+    "VECTOR_STORE_ID": "",
+    "MCP_URL": "",
+    "APP_TITLE": "Youtube Assistant",
+    "APP_ICON": "🎥",
+    "MAX_RESULTS_DEFAULT": 3,
+    "MAX_HISTORY": 100,
+    "ENABLE_WEB_SEARCH_DEFAULT": True,
+    "ENABLE_DOCUMENT_SEARCH_DEFAULT": False,
+    "ENABLE_MCP_SEARCH_DEFAULT": False,
+    "AGENT_NAME": "Youtube Assistant",
+    "AGENT_INSTRUCTIONS": "You are a research assistant who uses web search and document search to respond to questions.",
+    "AGENT_MODEL": "gpt-4o-mini"
+})
+
+# Values accepted as "enabled" for boolean settings
+_TRUTHY = frozenset({"1", "true", "yes", "on"})
+
+def _positive_int(value: Any, default: int) -> int:
+    """Coerce a setting to an int of at least 1, using the default if it isn't numeric."""
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return default
+
+@cache
+def _external_config_exists() -> bool:
+    """Check for the external config file once and remember the answer."""
+    return _EXTERNAL_CONFIG.exists()
 
 class Config:
     """Application configuration with multiple secure loading methods."""
@@ -15,60 +51,59 @@ class Config:
         """Initialize configuration from the most secure available source."""
         self._config_data = self._load_configuration()
         
-    def _load_configuration(self) -> Dict[str, Any]:
+    def _load_configuration(self) -> Mapping[str, Any]:
         """Load configuration from multiple sources in order of preference."""
         
         # Method 1: Try system environment variables first (most secure)
-        if self._has_required_env_vars():
+        env = os.environ
+        if env.get("OPENAI_API_KEY") and env.get("VECTOR_STORE_ID"):
             print("✅ Loading from system environment variables")
             return self._load_from_env()
         
         # Method 2: Try external config file (outside project)
-        external_config = Path.home() / ".config" / "youtube-assistant" / "config.json"
-        if external_config.exists():
-            print(f"✅ Loading from external config: {external_config}")
-            return self._load_from_json(external_config)
+        if _external_config_exists():
+            print(f"✅ Loading from external config: {_EXTERNAL_CONFIG}")
+            return self._load_from_json(_EXTERNAL_CONFIG)
         
         # Method 3: Try .env file (least secure, but fallback)
         if Path(".env").exists():
             print("⚠️  Loading from .env file (consider using more secure method)")
+            from dotenv import load_dotenv
             load_dotenv()
             return self._load_from_env()
         
         # Method 4: Use defaults with warnings
         print("❌ No configuration found, using defaults")
-        return self._get_defaults()
-    
-    def _has_required_env_vars(self) -> bool:
-        """Check if required environment variables are set in system."""
-        return bool(os.environ.get("OPENAI_API_KEY") and os.environ.get("VECTOR_STORE_ID"))
+        return _DEFAULTS
     
     def _load_from_env(self) -> Dict[str, Any]:
         """Load configuration from environment variables."""
+        env = os.environ
         return {
             # Required API Keys
-            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
-            "VECTOR_STORE_ID": os.getenv("VECTOR_STORE_ID", ""),
-            "MCP_URL": os.getenv("MCP_URL", ""),
+            "OPENAI_API_KEY": env.get("OPENAI_API_KEY", ""),
+            "VECTOR_STORE_ID": env.get("VECTOR_STORE_ID", ""),
+            "MCP_URL": env.get("MCP_URL", ""),
             
             # Application Settings
-            "APP_TITLE": os.getenv("APP_TITLE", "Youtube Assistant"),
-            "APP_ICON": os.getenv("APP_ICON", "🎥"),
+            "APP_TITLE": env.get("APP_TITLE", "Youtube Assistant"),
+            "APP_ICON": env.get("APP_ICON", "🎥"),
             
             # Default UI Settings
-            "MAX_RESULTS_DEFAULT": int(os.getenv("MAX_RESULTS_DEFAULT", "3")),
-            "ENABLE_WEB_SEARCH_DEFAULT": os.getenv("ENABLE_WEB_SEARCH_DEFAULT", "true").lower() == "true",
-            "ENABLE_DOCUMENT_SEARCH_DEFAULT": os.getenv("ENABLE_DOCUMENT_SEARCH_DEFAULT", "false").lower() == "true",
-            "ENABLE_MCP_SEARCH_DEFAULT": os.getenv("ENABLE_MCP_SEARCH_DEFAULT", "false").lower() == "true",
+            "MAX_RESULTS_DEFAULT": int(env.get("MAX_RESULTS_DEFAULT", "3")),
+            "MAX_HISTORY": _positive_int(env.get("MAX_HISTORY"), _DEFAULTS["MAX_HISTORY"]),
+            "ENABLE_WEB_SEARCH_DEFAULT": env.get("ENABLE_WEB_SEARCH_DEFAULT", "true").lower() in _TRUTHY,
+            "ENABLE_DOCUMENT_SEARCH_DEFAULT": env.get("ENABLE_DOCUMENT_SEARCH_DEFAULT", "false").lower() in _TRUTHY,
+            "ENABLE_MCP_SEARCH_DEFAULT": env.get("ENABLE_MCP_SEARCH_DEFAULT", "false").lower() in _TRUTHY,
 
             # Agent Configuration
-            "AGENT_NAME": os.getenv("AGENT_NAME", "Youtube Assistant"),
-            "AGENT_INSTRUCTIONS": os.getenv("AGENT_INSTRUCTIONS", 
+            "AGENT_NAME": env.get("AGENT_NAME", "Youtube Assistant"),
+            "AGENT_INSTRUCTIONS": env.get("AGENT_INSTRUCTIONS", 
                 "You are a research assistant who uses web search and document search to respond to questions."),
-            "AGENT_MODEL": os.getenv("AGENT_MODEL", "gpt-4o-mini")
+            "AGENT_MODEL": env.get("AGENT_MODEL", "gpt-4o-mini")
         }
     
-    def _load_from_json(self, config_path: Path) -> Dict[str, Any]:
+    def _load_from_json(self, config_path: Path) -> Mapping[str, Any]:
         """Load configuration from JSON file."""
         try:
             with open(config_path, 'r') as f:
@@ -76,27 +111,15 @@ class Config:
             # Merge with defaults
             defaults = self._get_defaults()
             defaults.update(config)
+            defaults["MAX_HISTORY"] = _positive_int(defaults["MAX_HISTORY"], _DEFAULTS["MAX_HISTORY"])
             return defaults
         except Exception as e:
             print(f"❌ Error loading config from {config_path}: {e}")
-            return self._get_defaults()
+            return _DEFAULTS
     
     def _get_defaults(self) -> Dict[str, Any]:
-        """Get default configuration values."""
-        return {
-            "OPENAI_API_KEY": "",
-            "VECTOR_STORE_ID": "",
-            "MCP_URL": "",
-            "APP_TITLE": "Youtube Assistant",
-            "APP_ICON": "🎥",
-            "MAX_RESULTS_DEFAULT": 3,
-            "ENABLE_WEB_SEARCH_DEFAULT": True,
-            "ENABLE_DOCUMENT_SEARCH_DEFAULT": False,
-            "ENABLE_MCP_SEARCH_DEFAULT": False,
-            "AGENT_NAME": "Youtube Assistant",
-            "AGENT_INSTRUCTIONS": "You are a research assistant who uses web search and document search to respond to questions.",
-            "AGENT_MODEL": "gpt-4o-mini"
-        }
+        """Get a mutable copy of the default configuration values."""
+        return dict(_DEFAULTS)
     
     # Properties for easy access
     @property
@@ -123,6 +146,10 @@ class Config:
     def MAX_RESULTS_DEFAULT(self) -> int:
         return self._config_data.get("MAX_RESULTS_DEFAULT", 3)
     
+    @property
+    def MAX_HISTORY(self) -> int:
+        return self._config_data.get("MAX_HISTORY", 100)
+    
     @property
     def ENABLE_WEB_SEARCH_DEFAULT(self) -> bool:
         return self._config_data.get("ENABLE_WEB_SEARCH_DEFAULT", True)
@@ -148,8 +175,7 @@ class Config:
     def AGENT_MODEL(self) -> str:
         return self._config_data.get("AGENT_MODEL", "gpt-4o-mini")
     
-    @classmethod
-    def validate_required_keys(cls) -> tuple[bool, list[str]]:
+    def validate_required_keys(self) -> tuple[bool, list[str]]:
         """
         Validate that core required environment variables are set.
         Note: Only validates truly required keys, not optional ones like MCP_URL.
@@ -157,28 +183,26 @@ class Config:
         Returns:
             tuple: (is_valid, missing_keys)
         """
-        config_instance = cls()
         missing_keys = []
         
-        if not config_instance.OPENAI_API_KEY:
+        if not self.OPENAI_API_KEY:
             missing_keys.append("OPENAI_API_KEY")
         
         # Note: VECTOR_STORE_ID and MCP_URL are optional - only required when their respective features are enabled
         
         return len(missing_keys) == 0, missing_keys
     
-    @classmethod
-    def get_env_status(cls) -> dict:
+    def get_env_status(self) -> dict:
         """Get the status of environment variables."""
-        config_instance = cls()
-        is_valid, missing_keys = cls.validate_required_keys()
+        openai_key_set = bool(self.OPENAI_API_KEY)
+        missing_keys = [] if openai_key_set else ["OPENAI_API_KEY"]
         
         return {
-            "is_valid": is_valid,
+            "is_valid": not missing_keys,
             "missing_keys": missing_keys,
-            "openai_key_set": bool(config_instance.OPENAI_API_KEY),
-            "vector_store_set": bool(config_instance.VECTOR_STORE_ID),
-            "mcp_url_set": bool(config_instance.MCP_URL),
+            "openai_key_set": openai_key_set,
+            "vector_store_set": bool(self.VECTOR_STORE_ID),
+            "mcp_url_set": bool(self.MCP_URL),
         }
 
 # Create a global config instance